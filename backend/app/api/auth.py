@@ -10,13 +10,16 @@ Responsibilities:
 This module follows OAuth2 password flow with bearer tokens.
 """
 
+import asyncio
+import os
 from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from typing import Optional
 
-from app.db.engine import SessionLocal
+from app.db.engine import get_db
 from app.db.models import User
 from app.schemas.pydantic_schemas import (
     UserCreate,
@@ -26,8 +29,14 @@ from app.schemas.pydantic_schemas import (
 from app.core.security import (
     hash_password,
     verify_password,
+    verify_dummy_password,
+    password_needs_rehash,
     create_access_token,
-    decode_token
+    decode_token,
+    CachedUser,
+    get_cached_user,
+    cache_user,
+    invalidate_user
 )
 
 # Router configuration for all auth-related endpoints
@@ -41,26 +50,41 @@ oauth2_scheme = OAuth2PasswordBearer(
 )
 
 # ---------------------------------------------------------------------
-# Database session dependency
-# Creates a new DB session per request and ensures proper cleanup
+# Helper: Load a user by id, preferring the in-memory user cache
+# Returns a CachedUser snapshot, or None if the user does not exist
 # ---------------------------------------------------------------------
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+def _load_user(db: Session, user_id: int) -> Optional[CachedUser]:
+    cached = get_cached_user(user_id)
+    if cached is not None:
+        return cached
+
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        return None
+    return cache_user(user)
+
+# ---------------------------------------------------------------------
+# Helper: Build the public user payload
+# Data comes from the database, so Pydantic validation is skipped
+# (response_model=None on the routes, documented via `responses`)
+# ---------------------------------------------------------------------
+def _user_response(user) -> UserResponse:
+    return UserResponse.model_construct(
+        id=user.id,
+        email=user.email,
+        full_name=user.full_name
+    )
 
 # ---------------------------------------------------------------------
 # Dependency: Get current authenticated user (REQUIRED)
 # - Decodes access token
-# - Fetches user from database
+# - Fetches user from cache or database
 # - Raises 401 if token is invalid or user does not exist
 # ---------------------------------------------------------------------
 def get_current_user(
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db)
-) -> User:
+) -> CachedUser:
     user_id = decode_token(token)
     if not user_id:
         raise HTTPException(
@@ -68,7 +92,7 @@ def get_current_user(
             detail="Invalid or expired token"
         )
 
-    user = db.query(User).filter(User.id == int(user_id)).first()
+    user = _load_user(db, int(user_id))
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -84,7 +108,7 @@ def get_current_user(
 def get_current_user_optional(
     token: Optional[str] = Depends(oauth2_scheme),
     db: Session = Depends(get_db)
-) -> Optional[User]:
+) -> Optional[CachedUser]:
     if not token:
         return None
 
@@ -92,7 +116,7 @@ def get_current_user_optional(
     if not user_id:
         return None
 
-    return db.query(User).filter(User.id == int(user_id)).first()
+    return _load_user(db, int(user_id))
 
 # ---------------------------------------------------------------------
 # User Registration
@@ -100,7 +124,11 @@ def get_current_user_optional(
 # - Hashes password before storing
 # - Returns public user information
 # ---------------------------------------------------------------------
-@router.post("/register", response_model=UserResponse)
+@router.post(
+    "/register",
+    response_model=None,
+    responses={200: {"model": UserResponse}}
+)
 def register_user(
     data: UserCreate,
     db: Session = Depends(get_db)
@@ -120,32 +148,71 @@ def register_user(
     db.add(user)
     db.commit()
     db.refresh(user)
-    return user
+    # Ensure no stale entry survives for a reused id
+    invalidate_user(user.id)
+    return _user_response(user)
+
+# ---------------------------------------------------------------------
+# Login concurrency limit
+# Password hashing is CPU-heavy; bounding concurrent verifications keeps a
+# login flood from occupying every threadpool worker.
+# ---------------------------------------------------------------------
+LOGIN_CONCURRENCY = (os.cpu_count() or 1) * 2
+_login_semaphore = asyncio.Semaphore(LOGIN_CONCURRENCY)
+
+
+def _authenticate(db: Session, email: str, password: str) -> Optional[int]:
+    """
+    Return the user id if the credentials are valid, otherwise None.
+    Runs in the threadpool since password verification is blocking.
+    """
+    user = db.query(User).filter(User.email == email).first()
+
+    if not user:
+        # Verify against a dummy hash so unknown emails take as long as
+        # wrong passwords and response time does not reveal account existence
+        verify_dummy_password(password)
+        return None
+
+    if not verify_password(password, user.hashed_password):
+        return None
+
+    user_id = user.id
+
+    # Re-hash legacy (e.g. bcrypt) passwords with the current scheme
+    if password_needs_rehash(user.hashed_password):
+        user.hashed_password = hash_password(password)
+        db.commit()
+        invalidate_user(user_id)
+
+    return user_id
 
 # ---------------------------------------------------------------------
 # User Login (OAuth2 Password Grant)
-# - Verifies credentials
+# - Verifies credentials (bounded concurrency, off the event loop)
+# - Upgrades legacy password hashes transparently
 # - Issues JWT access token
 # ---------------------------------------------------------------------
 @router.post("/login", response_model=TokenResponse)
-def login_user(
+async def login_user(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
 ):
-    user = db.query(User).filter(
-        User.email == form_data.username
-    ).first()
-
-    if not user or not verify_password(
-        form_data.password,
-        user.hashed_password
-    ):
+    async with _login_semaphore:
+        user_id = await run_in_threadpool(
+            _authenticate,
+            db,
+            form_data.username,
+            form_data.password
+        )
+
+    if user_id is None:
         raise HTTPException(
             status_code=401,
             detail="Invalid email or password"
         )
 
-    token = create_access_token(subject=str(user.id))
+    token = create_access_token(subject=str(user_id))
     return TokenResponse(
         access_token=token,
         token_type="bearer"
@@ -156,8 +223,12 @@ def login_user(
 # - Protected route
 # - Requires valid access token
 # ---------------------------------------------------------------------
-@router.get("/me", response_model=UserResponse)
+@router.get(
+    "/me",
+    response_model=None,
+    responses={200: {"model": UserResponse}}
+)
 def get_me(
-    current_user: User = Depends(get_current_user)
+    current_user: CachedUser = Depends(get_current_user)
 ):
-    return current_user
+    return _user_response(current_user)
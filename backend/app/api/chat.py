@@ -11,42 +11,93 @@ Responsibilities:
 """
 
 from typing import Optional
-import json
 import re
-from fastapi import APIRouter, Depends
+import time
+import orjson
+from fastapi import APIRouter, BackgroundTasks, Depends, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import StreamingResponse
+from sqlalchemy import insert, select, func
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.engine import SessionLocal
-from app.db.models import ChatSession, ChatMessage, User
+from app.db.engine import get_db, get_async_db
+from app.db.models import ChatSession, ChatMessage
+from app.core.security import CachedUser
 from app.api.auth import get_current_user_optional
 from app.services.llama_api import stream_llama_response
-from app.services.retriever_service import load_faiss_index, load_chunks
+from app.services.retriever_service import get_user_index, user_index_is_stale
+from app.api.files import rebuild_user_index
 from app.services.embeddings import embedding_service
-from app.utils.file_utils import get_user_dirs
 from app.schemas.pydantic_schemas import ChatRequest
+from app.utils.http_cache import check_not_modified
+from app.utils.responses import ORJSONResponse
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
-# ---------------------------------------------------------------------
-# DB session dependency
-# Provides a new SQLAlchemy session per request and ensures cleanup.
-# ---------------------------------------------------------------------
-def get_db():
-    db = SessionLocal()
+# Patterns used to derive session titles, compiled once at import
+_CODE_BLOCK_RE = re.compile(r'```[\s\S]*?```')
+_MD_NOISE_RE = re.compile(r'[`*_>#~-]+')
+_WS_RE = re.compile(r'\s+')
+
+# Streaming: flush buffered tokens once this many characters are pending,
+# or when this many seconds have passed since the last flush.
+STREAM_FLUSH_CHARS = 64
+STREAM_FLUSH_INTERVAL = 0.05
+
+# Pre-built Core INSERT for assistant replies persisted after streaming.
+# Bypasses the ORM unit-of-work since the row is never read back.
+_INSERT_MESSAGE = insert(ChatMessage.__table__)
+
+
+def _persist_reply(db: Session, session_id: int, user_id: int, content: str):
+    """
+    Store the assistant reply once streaming has finished.
+    """
     try:
-        yield db
+        db.execute(
+            _INSERT_MESSAGE,
+            {
+                "session_id": session_id,
+                "user_id": user_id,
+                "role": "assistant",
+                "content": content,
+            },
+        )
+        db.commit()
     finally:
         db.close()
 
 
+def _derive_session_title(question: str) -> str:
+    """
+    Derive a compact, clean session title from the first non-empty line of
+    the question. Code blocks and simple markdown characters are removed to
+    keep it readable. Returns an empty string if nothing usable remains.
+    """
+    if not question or not question.strip():
+        return ""
+
+    first_line = ""
+    for line in question.strip().splitlines():
+        if line.strip():
+            first_line = line.strip()
+            break
+
+    # remove triple-backtick code blocks and simple markdown noise
+    first_line = _CODE_BLOCK_RE.sub('', first_line)
+    first_line = _MD_NOISE_RE.sub('', first_line)
+    return _WS_RE.sub(' ', first_line).strip()[:60]
+
+
 # ----------------------------
 # CREATE / CONTINUE CHAT
 # ----------------------------
 @router.post("")
 async def chat(
     data: ChatRequest,
-    current_user: Optional[User] = Depends(get_current_user_optional),
+    background_tasks: BackgroundTasks,
+    current_user: Optional[CachedUser] = Depends(get_current_user_optional),
     db: Session = Depends(get_db),
 ):
     """
@@ -90,12 +141,20 @@ async def chat(
                 # If parsing / lookup fails, fallback to creating a new session.
                 session = None
 
-        # Create a new session if none exists (we keep title empty to set later)
+        # Derive the title up front so it can be written together with the
+        # session row instead of in a follow-up UPDATE.
+        clean_title = ""
+        if not session or not session.title or not session.title.strip():
+            clean_title = _derive_session_title(question)
+
+        # Create a new session if none exists; flush assigns its id without
+        # committing so session + first message share one transaction.
         if not session:
-            session = ChatSession(user_id=current_user.id, title="")
+            session = ChatSession(user_id=current_user.id, title=clean_title)
             db.add(session)
-            db.commit()
-            db.refresh(session)
+            db.flush()
+        elif clean_title:
+            session.title = clean_title
 
         persisted_session_id = session.id
 
@@ -110,28 +169,6 @@ async def chat(
         )
         db.commit()
 
-        # --- Set session title from first user message if not already set
-        # We derive a compact, clean title from the first non-empty line of the question.
-        # Remove code blocks and simple markdown characters to make it readable.
-        if not session.title or not session.title.strip():
-            if question and question.strip():
-                raw = question.strip()
-                first_line = ""
-                for line in raw.splitlines():
-                    if line.strip():
-                        first_line = line.strip()
-                        break
-
-                # remove triple-backtick code blocks and simple markdown noise
-                first_line = re.sub(r'```[\s\S]*?```', '', first_line)
-                first_line = re.sub(r'[`*_>#~-]+', '', first_line)
-                clean_title = re.sub(r'\s+', ' ', first_line).strip()[:60]
-
-                if clean_title:
-                    session.title = clean_title
-                    db.commit()
-                    db.refresh(session)
-
 
     # ----------------------------
     # DOCUMENT RETRIEVAL (AUTH ONLY)
@@ -140,10 +177,13 @@ async def chat(
     context_text = ""
 
     if current_user:
-        dirs = get_user_dirs(current_user.id)
-        index_dir = dirs["index"]
-        faiss_index = load_faiss_index(index_dir / "faiss.index")
-        chunks = load_chunks(index_dir / "chunk_texts.pkl")
+        # Cached per user; only reloaded from disk after uploads/deletes
+        faiss_index, chunks = get_user_index(current_user.id)
+
+        # Index embedded with another model/backend: answer without context
+        # and re-embed it in the background (runs after the response)
+        if faiss_index is None and user_index_is_stale(current_user.id):
+            background_tasks.add_task(rebuild_user_index, current_user.id, only_if_stale=True)
 
         # If we have both index and chunks, run retrieval and build a short context.
         if faiss_index and chunks:
@@ -160,9 +200,9 @@ async def chat(
             else:
                 # Conservative similarity threshold for including individual chunks.
                 SIM_THRESHOLD = 0.78
-                for score, idx in zip(D[0], I[0]):
-                    if score >= SIM_THRESHOLD and 0 <= idx < len(chunks):
-                        context_text += chunks[idx] + "\n\n"
+                scores, idxs = D[0], I[0]
+                mask = (scores >= SIM_THRESHOLD) & (idxs >= 0) & (idxs < len(chunks))
+                context_text = "".join(chunks[i] + "\n\n" for i in idxs[mask])
 
     # Truncate final context to a safe token/length budget for the model.
     context_text = context_text[:4000]
@@ -227,30 +267,51 @@ async def chat(
     # STREAMING RESPONSE
     # ----------------------------
     # We stream tokens from the model to the client and capture the full assistant text.
-    def event_stream():
-        assistant_text = ""
-
-        # stream_llama_response yields incremental tokens
-        for token in stream_llama_response(messages, max_tokens=max_tokens):
-            assistant_text += token
-            # Each chunk sent as newline-delimited JSON for NDJSON streaming clients
-            yield json.dumps({"content": token}) + "\n"
-
-        # After stream completes, persist assistant reply when session/user exist
+    async def event_stream():
+        reply_parts = []
+
+        # Tokens received but not yet sent to the client. Tokens are coalesced
+        # so each NDJSON line (and socket write) carries a batch, not 1-4 bytes.
+        pending = []
+        pending_chars = 0
+        last_flush = time.monotonic()
+
+        # stream_llama_response yields incremental tokens (non-blocking)
+        async for token in stream_llama_response(messages, max_tokens=max_tokens):
+            reply_parts.append(token)
+            pending.append(token)
+            pending_chars += len(token)
+
+            now = time.monotonic()
+            if (
+                pending_chars >= STREAM_FLUSH_CHARS
+                or now - last_flush >= STREAM_FLUSH_INTERVAL
+            ):
+                # Each chunk sent as newline-delimited JSON for NDJSON streaming clients
+                yield orjson.dumps({"content": "".join(pending)}) + b"\n"
+                pending.clear()
+                pending_chars = 0
+                last_flush = now
+
+        # Flush whatever is left once the model stream ends
+        if pending:
+            yield orjson.dumps({"content": "".join(pending)}) + b"\n"
+
+        assistant_text = "".join(reply_parts)
+
+        # After stream completes, persist assistant reply when session/user exist.
+        # The request's session is reused: get_db already closed it (releasing
+        # its connection) before streaming began, so a pooled connection is
+        # only checked out for this INSERT rather than for the whole stream.
         if persisted_session_id and persisted_user_id:
-            db2 = SessionLocal()
-            try:
-                db2.add(
-                    ChatMessage(
-                        session_id=persisted_session_id,
-                        user_id=persisted_user_id,
-                        role="assistant",
-                        content=assistant_text,
-                    )
-                )
-                db2.commit()
-            finally:
-                db2.close()
+            # Blocking DB write runs in the threadpool, off the event loop
+            await run_in_threadpool(
+                _persist_reply,
+                db,
+                persisted_session_id,
+                persisted_user_id,
+                assistant_text,
+            )
 
     # Include session id header so client can associate streamed replies with a session
     headers = {}
@@ -263,69 +324,130 @@ async def chat(
         headers=headers
     )
 
+# ----------------------------
+# CONDITIONAL GET SUPPORT
+# ----------------------------
+async def sessions_etag(
+    request: Request,
+    current_user: Optional[CachedUser] = Depends(get_current_user_optional),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Dependency fingerprinting the user's session list.
+    Responds 304 if the client's cached list is still current.
+
+    Session titles only change alongside a new message, so the latest
+    message id is included with the session count and max id.
+    """
+    if not current_user:
+        return None
+
+    latest_message_id = (
+        select(func.max(ChatMessage.id))
+        .where(ChatMessage.user_id == current_user.id)
+        .scalar_subquery()
+    )
+    count, max_id, last_msg = (await db.execute(
+        select(func.count(ChatSession.id), func.max(ChatSession.id), latest_message_id)
+        .where(ChatSession.user_id == current_user.id)
+    )).one()
+    return check_not_modified(request, "sessions", current_user.id, count, max_id, last_msg)
+
+
+async def history_etag(
+    session_id: int,
+    request: Request,
+    current_user: Optional[CachedUser] = Depends(get_current_user_optional),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Dependency fingerprinting a session's message history.
+    Responds 304 if the client's cached history is still current.
+    Messages are append-only, so (count, max id) identifies the history.
+    """
+    if not current_user:
+        return None
+
+    count, max_id = (await db.execute(
+        select(func.count(ChatMessage.id), func.max(ChatMessage.id))
+        .where(
+            ChatMessage.session_id == session_id,
+            ChatMessage.user_id == current_user.id,
+        )
+    )).one()
+    return check_not_modified(request, "history", current_user.id, session_id, count, max_id)
+
+
 # ----------------------------
 # LIST CHAT SESSIONS
 # ----------------------------
 @router.get("/sessions")
-def list_sessions(
-    current_user: Optional[User] = Depends(get_current_user_optional),
-    db: Session = Depends(get_db),
+async def list_sessions(
+    current_user: Optional[CachedUser] = Depends(get_current_user_optional),
+    db: AsyncSession = Depends(get_async_db),
+    cache_headers: Optional[dict] = Depends(sessions_etag),
 ):
     """
     Return recent chat sessions for an authenticated user.
     Guests receive an empty list.
     """
     if not current_user:
-        return []
+        return ORJSONResponse([])
 
-    sessions = (
-        db.query(ChatSession)
-        .filter(ChatSession.user_id == current_user.id)
+    # Select only the listed columns; rows map straight to the response
+    rows = (await db.execute(
+        select(ChatSession.id, ChatSession.created_at, ChatSession.title)
+        .where(ChatSession.user_id == current_user.id)
         .order_by(ChatSession.created_at.desc())
-        .all()
-    )
+    )).all()
 
-    return [
-        {
-            "id": s.id,
-            "created_at": s.created_at,
-            "title": s.title,
-        }
-        for s in sessions
-    ]
+    return ORJSONResponse(
+        [
+            {
+                "id": id_,
+                "created_at": created_at,
+                "title": title,
+            }
+            for id_, created_at, title in rows
+        ],
+        headers=cache_headers,
+    )
 
 
 # ----------------------------
 # GET CHAT HISTORY
 # ----------------------------
 @router.get("/history/{session_id}")
-def get_history(
+async def get_history(
     session_id: int,
-    current_user: Optional[User] = Depends(get_current_user_optional),
-    db: Session = Depends(get_db),
+    current_user: Optional[CachedUser] = Depends(get_current_user_optional),
+    db: AsyncSession = Depends(get_async_db),
+    cache_headers: Optional[dict] = Depends(history_etag),
 ):
     """
     Return ordered messages for a specific session belonging to the current user.
     Guests receive an empty list.
     """
     if not current_user:
-        return []
+        return ORJSONResponse([])
 
-    messages = (
-        db.query(ChatMessage)
-        .filter(
+    rows = (await db.execute(
+        select(ChatMessage.role, ChatMessage.content, ChatMessage.created_at)
+        .where(
             ChatMessage.session_id == session_id,
             ChatMessage.user_id == current_user.id,
         )
         .order_by(ChatMessage.created_at)
-        .all()
-    )
+    )).all()
 
-    return [
-        {
-            "role": m.role,
-            "content": m.content,
-            "created_at": m.created_at,
-        }
-        for m in messages
-    ]
+    return ORJSONResponse(
+        [
+            {
+                "role": role,
+                "content": content,
+                "created_at": created_at,
+            }
+            for role, content, created_at in rows
+        ],
+        headers=cache_headers,
+    )
@@ -7,50 +7,74 @@ Responsibilities:
 - Offload heavy processing (text extraction, chunking, embeddings, FAISS index build)
   to a background task to keep the request non-blocking.
 - Provide endpoints to list and delete user documents.
-- Ensure index/chunk state is rebuilt after deletions to keep retrieval consistent.
+- Ensure index/chunk state is rebuilt after deletions to keep retrieval consistent
+  (in the background, from per-document chunk files).
 """
 
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
+import asyncio
+import threading
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, func
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from pathlib import Path
 from fastapi import BackgroundTasks
-from app.db.engine import SessionLocal
+from app.db.engine import SessionLocal, get_db, get_async_db
 from app.db.models import Document
 from app.api.auth import get_current_user
 from app.utils.file_utils import get_user_dirs, save_upload_file, delete_file_safe
+from app.utils.http_cache import check_not_modified
+from app.utils.responses import ORJSONResponse
 from app.services.retriever_service import (
-    load_chunks, save_chunks, build_faiss_index
+    load_chunks, save_chunks, append_chunks, migrate_legacy_chunks,
+    load_document_chunks, save_document_chunks,
+    build_faiss_index, invalidate_user_index, document_chunks_path,
+    user_index_is_stale,
+    INDEX_FILENAME, CHUNKS_FILENAME
 )
 from app.services.embeddings import embedding_service
 from app.utils_extraction import extract_text_from_file, clean_text, chunk_text
 
 router = APIRouter(prefix="/files", tags=["files"])
 
-# ---------------------------------------------------------------------
-# DB session dependency
-# Creates a new SQLAlchemy session per request and ensures proper cleanup.
-# ---------------------------------------------------------------------
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # ---------------------------
-# BACKGROUND PROCESSOR
+# BACKGROUND PROCESSORS
 # ---------------------------
+# Per-user locks so concurrent upload/delete background tasks never
+# interleave writes to the same chunk store and index.
+_index_locks: dict[int, threading.Lock] = {}
+_index_locks_guard = threading.Lock()
+
+
+def _user_index_lock(user_id: int) -> threading.Lock:
+    with _index_locks_guard:
+        return _index_locks.setdefault(user_id, threading.Lock())
+
+
+def _extract_document_chunks(file_path: str) -> list[str]:
+    """
+    Extract, clean, and chunk a single document.
+    """
+    raw = extract_text_from_file(file_path)
+    cleaned = clean_text(raw)
+    return chunk_text(cleaned)
+
+
 def process_uploaded_files(
     user_id: int,
-    files: list[str],
+    documents: list[tuple[int, str]],
 ):
     """
     Background task that:
-    - Reads uploaded files from the user's uploads directory
+    - Reads uploaded files (given as `(document_id, filename)` pairs)
+      from the user's uploads directory
     - Extracts and cleans text
     - Produces text chunks suitable for retrieval/embedding
-    - Merges with existing chunks and persists them
+    - Persists each document's chunks separately so later rebuilds never
+      need to re-extract the file
+    - Appends them to the existing chunk store
     - Builds/updates the FAISS index (heavy CPU work moved off the request thread)
     """
 
@@ -58,32 +82,126 @@ def process_uploaded_files(
     uploads_dir = dirs["uploads"]
     index_dir = dirs["index"]
 
-    all_new_chunks = []
+    # Extract outside the lock: this is the slow part and touches nothing shared
+    extracted = [
+        (document_id, _extract_document_chunks(str(uploads_dir / filename)))
+        for document_id, filename in documents
+    ]
+
+    with _user_index_lock(user_id):
+        # A delete-triggered rebuild may have run while we extracted: it
+        # re-extracts documents without a chunk file (so theirs are already
+        # in the store) and drops deleted ones. Skip both.
+        db = SessionLocal()
+        try:
+            active_ids = {
+                row.id
+                for row in db.query(Document.id).filter(
+                    Document.id.in_([document_id for document_id, _ in extracted]),
+                    Document.is_deleted == False,
+                )
+            }
+        finally:
+            db.close()
+
+        all_new_chunks = []
+        for document_id, chunks in extracted:
+            doc_chunk_path = document_chunks_path(index_dir, document_id)
+            if document_id not in active_ids or doc_chunk_path.exists():
+                continue
+
+            # Keep per-document chunks (even if empty) for cheap rebuilds on delete
+            save_document_chunks(doc_chunk_path, chunks)
+            all_new_chunks.extend(chunks)
+
+        # If no new chunks were produced, nothing to do
+        if not all_new_chunks:
+            return
 
-    # Iterate uploaded filenames and extract textual content
-    for filename in files:
-        file_path = uploads_dir / filename
+        # Append only the new chunks to the store; the merged list is still
+        # needed in memory to build the index
+        migrate_legacy_chunks(index_dir)
+        chunk_path = index_dir / CHUNKS_FILENAME
+        existing = load_chunks(chunk_path)
+        append_chunks(chunk_path, all_new_chunks)
+        merged = existing + all_new_chunks
 
-        raw = extract_text_from_file(str(file_path))
-        cleaned = clean_text(raw)
-        chunks = chunk_text(cleaned)
+        # Build or rebuild the FAISS index using the merged chunks.
+        # This is intentionally a heavy, synchronous CPU task executed in the background.
+        build_faiss_index(merged, index_dir / INDEX_FILENAME)
 
-        if chunks:
-            all_new_chunks.extend(chunks)
+        # Drop the in-memory copy so the next chat request picks up the new index
+        invalidate_user_index(user_id)
+
+
+def rebuild_user_index(user_id: int, only_if_stale: bool = False):
+    """
+    Background task that rebuilds a user's chunk store and FAISS index from
+    all remaining (non-deleted) documents.
+
+    Each document's chunks are read from its per-document chunk file; only
+    documents without one (e.g. uploaded before these files existed) are
+    re-extracted, and their chunk file is written for next time.
+
+    With `only_if_stale`, nothing is done unless the index was embedded with
+    a different model/backend. Such rebuilds are requested by every chat
+    that sees the stale index, so they never wait for the per-user lock:
+    if another upload/rebuild holds it, that run already re-embeds the
+    index and the task returns at once instead of occupying a threadpool
+    worker for the whole re-embed.
+    """
+
+    lock = _user_index_lock(user_id)
+    if only_if_stale:
+        if not lock.acquire(blocking=False):
+            return
+    else:
+        lock.acquire()
+    try:
+        if only_if_stale and not user_index_is_stale(user_id):
+            return
+        _rebuild_user_index_locked(user_id)
+    finally:
+        lock.release()
 
-    # If no new chunks were produced, nothing to do
-    if not all_new_chunks:
-        return
 
-    # Merge with any existing chunks and persist
-    chunk_path = index_dir / "chunk_texts.pkl"
-    existing = load_chunks(chunk_path)
-    merged = existing + all_new_chunks
-    save_chunks(chunk_path, merged)
+def _rebuild_user_index_locked(user_id: int):
+    """
+    Rebuild a user's chunk store and index; caller holds the user's lock.
+    """
+    index_dir = get_user_dirs(user_id)["index"]
+
+    db = SessionLocal()
+    try:
+        remaining = (
+            db.query(Document.id, Document.file_path)
+            .filter(Document.user_id == user_id, Document.is_deleted == False)
+            .order_by(Document.id)
+            .all()
+        )
+    finally:
+        db.close()
 
-    # Build or rebuild the FAISS index using the merged chunks.
-    # This is intentionally a heavy, synchronous CPU task executed in the background.
-    build_faiss_index(merged, index_dir / "faiss.index")
+    all_chunks = []
+    for document_id, file_path in remaining:
+        doc_chunk_path = document_chunks_path(index_dir, document_id)
+        if doc_chunk_path.exists():
+            chunks = load_document_chunks(doc_chunk_path)
+        else:
+            chunks = _extract_document_chunks(file_path)
+            save_document_chunks(doc_chunk_path, chunks)
+        all_chunks.extend(chunks)
+
+    # Swap in the new index before replacing the chunk store: while the
+    # (slow) re-embedding runs, readers keep the old index/chunk pair
+    # rather than pairing the old index with shifted chunk positions
+    if all_chunks:
+        build_faiss_index(all_chunks, index_dir / INDEX_FILENAME)
+    else:
+        # No documents left: drop the index instead of keeping a stale one
+        delete_file_safe(index_dir / INDEX_FILENAME)
+    save_chunks(index_dir / CHUNKS_FILENAME, all_chunks)
+    invalidate_user_index(user_id)
 
 
 # ---------------------------
@@ -105,60 +223,93 @@ async def upload_files(
     dirs = get_user_dirs(current_user.id)
     uploads_dir = dirs["uploads"]
 
-    saved_filenames = []
-
-    # Persist file to disk and record a Document entry per file synchronously.
-    for f in files:
-        file_path = uploads_dir / f.filename
-        save_upload_file(f, file_path)
-
-        doc = Document(
+    # Repeated filenames would be copied to the same path concurrently and
+    # interleave on disk; keep only the last file per name (as sequential
+    # writes would have left it).
+    files = list({f.filename: f for f in files}.values())
+
+    # Write all files to disk concurrently in the threadpool so the blocking
+    # copies never stall the event loop.
+    await asyncio.gather(*(
+        run_in_threadpool(save_upload_file, f, uploads_dir / f.filename)
+        for f in files
+    ))
+
+    # Record all Document entries in a single transaction. Primary keys are
+    # populated on flush, so no per-row refresh is needed.
+    docs = [
+        Document(
             user_id=current_user.id,
             filename=f.filename,
-            file_path=str(file_path)
+            file_path=str(uploads_dir / f.filename)
         )
-        db.add(doc)
-        db.commit()
-        db.refresh(doc)
-
-        saved_filenames.append(f.filename)
+        for f in files
+    ]
+    db.add_all(docs)
+    db.flush()
+    saved_documents = [(doc.id, doc.filename) for doc in docs]
+    db.commit()
 
     # Schedule the CPU-bound processing after the response is returned.
     background_tasks.add_task(
         process_uploaded_files,
         current_user.id,
-        saved_filenames
+        saved_documents
     )
 
     return {
         "message": f"{len(files)} files uploaded successfully. Processing started."
     }
 
+# ---------------------------
+# CONDITIONAL GET SUPPORT
+# ---------------------------
+async def documents_etag(
+    request: Request,
+    current_user=Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Dependency fingerprinting the user's active documents.
+    Responds 304 if the client's cached list is still current.
+
+    Uploads always add a higher id and deletes change the count, so
+    (count, max id) changes whenever the listing does.
+    """
+    count, max_id = (await db.execute(
+        select(func.count(Document.id), func.max(Document.id))
+        .where(Document.user_id == current_user.id, Document.is_deleted == False)
+    )).one()
+    return check_not_modified(request, "documents", current_user.id, count, max_id)
+
 # ---------------------------
 # LIST USER DOCUMENTS
 # ---------------------------
 @router.get("/list")
-def list_documents(
+async def list_documents(
     current_user=Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
+    cache_headers: dict = Depends(documents_etag)
 ):
     """
     Return non-deleted documents for the authenticated user.
     The response includes basic metadata used by the frontend.
     """
-    docs = (
-        db.query(Document)
-        .filter(Document.user_id == current_user.id, Document.is_deleted == False)
-        .all()
+    rows = (await db.execute(
+        select(Document.id, Document.filename, Document.uploaded_at)
+        .where(Document.user_id == current_user.id, Document.is_deleted == False)
+    )).all()
+    return ORJSONResponse(
+        [
+            {
+                "id": id_,
+                "filename": filename,
+                "uploaded_at": uploaded_at
+            }
+            for id_, filename, uploaded_at in rows
+        ],
+        headers=cache_headers
     )
-    return [
-        {
-            "id": d.id,
-            "filename": d.filename,
-            "uploaded_at": d.uploaded_at
-        }
-        for d in docs
-    ]
 
 # ---------------------------
 # DELETE DOCUMENT
@@ -166,14 +317,16 @@ def list_documents(
 @router.delete("/{document_id}")
 def delete_document(
     document_id: int,
+    background_tasks: BackgroundTasks,
     current_user=Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
     Delete a user's document:
-    - Remove file from storage (safe-delete utility)
+    - Remove file and its per-document chunks from storage (safe-delete utility)
     - Mark document as deleted in DB (soft delete)
-    - Rebuild the chunk store and FAISS index from remaining documents so retrieval stays consistent
+    - Schedule a rebuild of the chunk store and FAISS index from remaining
+      documents so retrieval stays consistent (runs after the response)
     """
 
     # Ensure the document belongs to the current user
@@ -191,6 +344,8 @@ def delete_document(
 
     # Remove the file from disk (safe delete that tolerates missing files)
     delete_file_safe(Path(doc.file_path))
+    index_dir = get_user_dirs(current_user.id)["index"]
+    delete_file_safe(document_chunks_path(index_dir, doc.id))
 
     # Soft-delete in DB so history is preserved if needed
     doc.is_deleted = True
@@ -198,21 +353,6 @@ def delete_document(
 
     # Rebuild FAISS index and chunk store from all remaining (non-deleted) documents.
     # This ensures the retrieval index reflects the current set of user documents.
-    dirs = get_user_dirs(current_user.id)
-    index_dir = dirs["index"]
-    chunk_path = index_dir / "chunk_texts.pkl"
-
-    all_chunks = []
-    for d in (
-        db.query(Document)
-        .filter(Document.user_id == current_user.id, Document.is_deleted == False)
-        .all()
-    ):
-        raw = extract_text_from_file(d.file_path)
-        cleaned = clean_text(raw)
-        all_chunks.extend(chunk_text(cleaned))
-
-    save_chunks(chunk_path, all_chunks)
-    build_faiss_index(all_chunks, index_dir / "faiss.index")
+    background_tasks.add_task(rebuild_user_index, current_user.id)
 
     return {"message": "Document deleted successfully"}
@@ -55,6 +55,17 @@ class Settings:
         "llama-3.1-8b-instant"
     )
 
+    # ------------------------
+    # Embedding configuration
+    # ------------------------
+    # Embedding backend: "onnx" (int8-quantized ONNX Runtime, used when
+    # available) or "torch" (SentenceTransformer in PyTorch)
+    EMBEDDING_BACKEND: str = os.getenv("EMBEDDING_BACKEND", "onnx")
+
+    # Optional Redis URL (e.g. redis://localhost:6379/0) used to cache
+    # query embeddings. Caching is disabled when unset.
+    REDIS_URL: str = os.getenv("REDIS_URL")
+
 
 # Singleton settings instance imported across the app
 settings = Settings()
@@ -1,4 +1,9 @@
+from dataclasses import dataclass
 from datetime import datetime, timedelta
+import hashlib
+import threading
+import time
+from cachetools import TTLCache
 from jose import jwt, JWTError
 from passlib.context import CryptContext
 from typing import Optional
@@ -11,11 +16,21 @@ Responsibilities:
 - Password hashing and verification
 - JWT access token creation
 - JWT token decoding and validation
+- Short-lived caching of verified tokens and authenticated users
 """
 
-# Password hashing context using bcrypt.
-# `deprecated="auto"` allows smooth upgrades of hashing schemes in the future.
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing context using Argon2id.
+# bcrypt stays listed (as deprecated) so existing hashes still verify and
+# are upgraded to Argon2id on the next successful login.
+# Cost parameters follow the OWASP recommendations.
+pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    deprecated=["bcrypt"],
+    argon2__type="ID",
+    argon2__memory_cost=65536,
+    argon2__time_cost=3,
+    argon2__parallelism=2,
+)
 
 # ------------------------
 # Password utilities
@@ -35,9 +50,48 @@ def verify_password(plain: str, hashed: str) -> bool:
     """
     return pwd_context.verify(plain, hashed)
 
+
+# Hash of a throwaway password, verified when a login names an unknown
+# account so both failure paths cost the same.
+_DUMMY_HASH = pwd_context.hash("documind-dummy-password")
+
+
+def verify_dummy_password(plain: str) -> None:
+    """
+    Run a full password verification whose result is discarded.
+    Used to keep login timing constant for non-existent users.
+    """
+    pwd_context.verify(plain, _DUMMY_HASH)
+
+
+def password_needs_rehash(hashed: str) -> bool:
+    """
+    Return True if a stored hash uses a deprecated scheme or outdated
+    parameters and should be replaced after a successful login.
+    """
+    return pwd_context.needs_update(hashed)
+
 # ------------------------
 # JWT utilities
 # ------------------------
+# Maximum time (in seconds) a verified token is served from the cache
+# before its signature is checked again.
+TOKEN_CACHE_TTL = 30
+
+# Cache of verified tokens: token digest -> (subject, expiry timestamp).
+# The same bearer token is reused on every request, so this avoids
+# re-running signature verification on the hot request path.
+_token_cache = TTLCache(maxsize=10000, ttl=TOKEN_CACHE_TTL)
+_token_cache_lock = threading.Lock()
+
+
+def _token_key(token: str) -> bytes:
+    """
+    Derive a compact cache key from a raw token.
+    Raw tokens are never stored in memory beyond the current request.
+    """
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
 def create_access_token(
     subject: str,
     expires_delta: Optional[timedelta] = None
@@ -78,15 +132,92 @@ def decode_token(token: str) -> Optional[str]:
 
     - Returns the subject (`sub`) if the token is valid.
     - Returns None if the token is invalid or expired.
+    - Successful results are cached briefly; failures are never cached.
     """
 
+    key = _token_key(token)
+    now = time.time()
+
+    with _token_cache_lock:
+        cached = _token_cache.get(key)
+    if cached is not None:
+        subject, exp = cached
+        # Never serve a token past its own expiry, even if the entry is fresh
+        if exp is None or exp > now:
+            return subject
+        with _token_cache_lock:
+            _token_cache.pop(key, None)
+
     try:
         payload = jwt.decode(
             token,
             settings.JWT_SECRET,
             algorithms=[settings.JWT_ALGORITHM]
         )
-        return payload.get("sub")
     except JWTError:
         # Covers invalid signature, expired token, or malformed payload
         return None
+
+    subject = payload.get("sub")
+    exp = payload.get("exp")
+    if subject is not None:
+        with _token_cache_lock:
+            _token_cache[key] = (subject, exp)
+    return subject
+
+
+# ------------------------
+# Authenticated user cache
+# ------------------------
+# Maximum time (in seconds) a user record is served from the cache
+USER_CACHE_TTL = 60
+
+
+@dataclass(frozen=True)
+class CachedUser:
+    """
+    Lightweight, session-independent snapshot of a user row.
+
+    Stored instead of the ORM instance so cached users never become
+    detached from (or leak) a database session.
+    """
+    id: int
+    email: str
+    full_name: Optional[str]
+    hashed_password: str
+
+
+# Cache of user snapshots keyed by user id
+_user_cache = TTLCache(maxsize=5000, ttl=USER_CACHE_TTL)
+_user_cache_lock = threading.Lock()
+
+
+def get_cached_user(user_id: int) -> Optional[CachedUser]:
+    """
+    Return the cached snapshot for a user, or None on a cache miss.
+    """
+    with _user_cache_lock:
+        return _user_cache.get(user_id)
+
+
+def cache_user(user) -> CachedUser:
+    """
+    Store a snapshot of a user ORM object and return it.
+    """
+    snapshot = CachedUser(
+        id=user.id,
+        email=user.email,
+        full_name=user.full_name,
+        hashed_password=user.hashed_password,
+    )
+    with _user_cache_lock:
+        _user_cache[user.id] = snapshot
+    return snapshot
+
+
+def invalidate_user(user_id: int) -> None:
+    """
+    Drop a user from the cache (call after any change to the user row).
+    """
+    with _user_cache_lock:
+        _user_cache.pop(user_id, None)
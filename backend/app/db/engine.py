@@ -1,4 +1,6 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
 import os
@@ -10,6 +12,8 @@ This module:
 - Loads database configuration from environment variables
 - Initializes the SQLAlchemy engine
 - Provides a reusable session factory for database access
+- Exposes the shared per-request session dependency
+- Provides an asyncio engine/session (asyncpg) for async read endpoints
 """
 
 # Load environment variables from .env into process environment
@@ -21,15 +25,43 @@ if not DATABASE_URL:
     # Fail fast if database configuration is missing
     raise RuntimeError("DATABASE_URL not found in environment")
 
+# Connection pool settings (ignored for SQLite, which uses its own pooling).
+# - pool_pre_ping transparently replaces connections dropped by DB restarts
+# - pool_recycle avoids server-side idle timeouts closing pooled connections
+# - pool_use_lifo keeps a small hot set of connections in use
+if make_url(DATABASE_URL).get_backend_name() == "sqlite":
+    engine_options = {
+        # Sessions may be used from FastAPI's threadpool
+        "connect_args": {"check_same_thread": False},
+    }
+else:
+    engine_options = {
+        "pool_size": 20,
+        "max_overflow": 40,
+        "pool_pre_ping": True,
+        "pool_recycle": 1800,
+        "pool_use_lifo": True,
+    }
+
 # Create SQLAlchemy engine.
 # `future=True` enables SQLAlchemy 2.0 style behavior.
 # `echo=False` disables SQL query logging (enable for debugging).
 engine = create_engine(
     DATABASE_URL,
     echo=False,
-    future=True
+    future=True,
+    **engine_options
 )
 
+# SQLite leaves foreign keys unenforced unless asked per connection;
+# enable them so ON DELETE CASCADE removes child rows as on PostgreSQL.
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine, "connect")
+    def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
 # SQLAlchemy session factory.
 # - autocommit=False ensures explicit transaction control
 # - autoflush=False prevents automatic flushes before queries
@@ -38,3 +70,101 @@ SessionLocal = sessionmaker(
     autoflush=False,
     bind=engine
 )
+
+
+def get_db():
+    """
+    FastAPI dependency providing a SQLAlchemy session per request.
+
+    Defined once and shared by all routers so that FastAPI's per-request
+    dependency cache hands the same session to authentication and the
+    endpoint, instead of checking out two pooled connections.
+    """
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+# ---------------------------------------------------------------------
+# Async engine (read endpoints)
+# ---------------------------------------------------------------------
+# The same database is reached through an asyncio driver so async routes
+# can query without a threadpool hop. asyncpg also decodes rows in C.
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+# The async pool is kept small: it only serves the list endpoints, and
+# together with the sync pool it must stay well under PostgreSQL's
+# default max_connections (100) per worker process.
+ASYNC_POOL_OPTIONS = {
+    "pool_size": 10,
+    "max_overflow": 10,
+    "pool_pre_ping": True,
+    "pool_recycle": 1800,
+}
+
+
+def _async_url_and_connect_args(url):
+    """
+    Derive the asyncio driver URL from the sync DATABASE_URL.
+
+    libpq/psycopg2 query parameters are not understood by asyncpg.connect,
+    so the common ones are translated into asyncpg connect arguments and
+    any others are dropped (with a warning) instead of failing every query.
+    """
+    backend = url.get_backend_name()
+    url = url.set(drivername=ASYNC_DRIVERS.get(backend, url.drivername))
+    if backend != "postgresql" or not url.query:
+        return url, {}
+
+    query = dict(url.query)
+    connect_args = {}
+    if "sslmode" in query:
+        connect_args["ssl"] = query.pop("sslmode")
+    if "connect_timeout" in query:
+        connect_args["timeout"] = float(query.pop("connect_timeout"))
+    if "application_name" in query:
+        connect_args["server_settings"] = {
+            "application_name": query.pop("application_name")
+        }
+    if query:
+        print(f"[WARN] Ignoring DATABASE_URL parameters for asyncpg: {', '.join(query)}")
+
+    return url.set(query={}), connect_args
+
+
+ASYNC_DATABASE_URL, _async_connect_args = _async_url_and_connect_args(
+    make_url(DATABASE_URL)
+)
+
+if ASYNC_DATABASE_URL.get_backend_name() == "sqlite":
+    # SQLite has no server-side connection limit to protect
+    async_engine_options = {}
+else:
+    async_engine_options = dict(ASYNC_POOL_OPTIONS, connect_args=_async_connect_args)
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    echo=False,
+    **async_engine_options
+)
+
+# expire_on_commit=False: attributes stay readable after commit without
+# an implicit (and, under asyncio, disallowed) lazy refresh
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    autoflush=False,
+    expire_on_commit=False
+)
+
+
+async def get_async_db():
+    """
+    FastAPI dependency providing an AsyncSession per request.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
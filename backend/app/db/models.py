@@ -6,6 +6,7 @@ from sqlalchemy import (
     DateTime,
     ForeignKey,
     Boolean,
+    Index,
     func
 )
 from sqlalchemy.orm import relationship
@@ -21,7 +22,11 @@ This module defines all SQLAlchemy models used by the application:
 - Individual chat messages
 
 Relationships are explicitly defined to support cascading deletes
-and consistent data cleanup.
+and consistent data cleanup. No route walks them, so they are declared
+lazy="raise_on_sql": an accidental per-row lazy load (N+1 queries) fails
+loudly instead of silently issuing one SELECT per object. Child rows of a
+deleted parent are removed by the database's ON DELETE CASCADE
+(passive_deletes) rather than loaded and deleted one by one.
 """
 
 # ------------------------
@@ -54,12 +59,16 @@ class User(Base):
     documents = relationship(
         "Document",
         back_populates="owner",
-        cascade="all, delete"
+        cascade="all, delete",
+        passive_deletes=True,
+        lazy="raise_on_sql"
     )
     sessions = relationship(
         "ChatSession",
         back_populates="user",
-        cascade="all, delete"
+        cascade="all, delete",
+        passive_deletes=True,
+        lazy="raise_on_sql"
     )
 
 
@@ -91,8 +100,13 @@ class Document(Base):
     # Soft-delete flag (used instead of hard DB deletes)
     is_deleted = Column(Boolean, default=False)
 
+    # Composite index for "active documents of a user" lookups
+    __table_args__ = (
+        Index("ix_documents_user_active", user_id, is_deleted),
+    )
+
     # Relationship back to owning user
-    owner = relationship("User", back_populates="documents")
+    owner = relationship("User", back_populates="documents", lazy="raise_on_sql")
 
 
 # ------------------------
@@ -119,12 +133,19 @@ class ChatSession(Base):
     # Session creation timestamp
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    # Composite index for listing a user's sessions newest-first
+    __table_args__ = (
+        Index("ix_chat_sessions_user_created", user_id, created_at.desc()),
+    )
+
     # Relationships
-    user = relationship("User", back_populates="sessions")
+    user = relationship("User", back_populates="sessions", lazy="raise_on_sql")
     messages = relationship(
         "ChatMessage",
         back_populates="session",
-        cascade="all, delete"
+        cascade="all, delete",
+        passive_deletes=True,
+        lazy="raise_on_sql"
     )
 
 
@@ -155,5 +176,19 @@ class ChatMessage(Base):
     # Message timestamp
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    # Composite indexes:
+    # - loading a session's history in order
+    # - a user's latest message id (session list ETag); also covers the
+    #   user_id foreign key
+    __table_args__ = (
+        Index(
+            "ix_chat_messages_session_user_created",
+            session_id,
+            user_id,
+            created_at,
+        ),
+        Index("ix_chat_messages_user_id", user_id, id),
+    )
+
     # Relationship back to parent session
-    session = relationship("ChatSession", back_populates="messages")
+    session = relationship("ChatSession", back_populates="messages", lazy="raise_on_sql")
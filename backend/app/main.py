@@ -9,14 +9,35 @@ This module:
 - Exposes a simple health check endpoint
 """
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.auth import router as auth_router
 from app.api.files import router as files_router
 from app.api.chat import router as chat_router
+from app.services.llama_api import http_client as llama_http_client
+from app.db.engine import async_engine
+from app.utils.responses import ORJSONResponse
 
-# Create FastAPI application instance
-app = FastAPI(title="DocuMind API")
+
+# ---------------------------------------------------------------------
+# Application Lifespan
+# ---------------------------------------------------------------------
+# Close pooled connections to the model API and the database on shutdown.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await llama_http_client.aclose()
+    await async_engine.dispose()
+
+
+# Create FastAPI application instance.
+# orjson is used for all JSON responses (faster encoding of list endpoints).
+app = FastAPI(
+    title="DocuMind API",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
+)
 
 # ---------------------------------------------------------------------
 # CORS Configuration
@@ -49,4 +70,4 @@ app.include_router(chat_router)
 # Simple endpoint used for uptime monitoring and deployment validation
 @app.get("/health")
 def health():
-    return {"status": "ok"}
+    return ORJSONResponse({"status": "ok"})
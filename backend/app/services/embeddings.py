@@ -1,26 +1,174 @@
+import os
+import shutil
+import hashlib
+import tempfile
+import torch
+from pathlib import Path
 from sentence_transformers import SentenceTransformer
 import numpy as np
+from app.core.config import settings
+from app.utils.file_utils import BASE_DIR
 
 """
 Embedding service responsible for converting text into vector representations.
 
 This module:
 - Loads a pretrained sentence embedding model
+- Prefers an int8-quantized ONNX Runtime build of the model on CPU
 - Provides utilities for embedding documents and user queries
+- Caches query embeddings in Redis (when configured) for repeated questions
 - Ensures embeddings are normalized and compatible with FAISS indexing
 """
 
+# Attempt to load ONNX Runtime + Optimum for the quantized CPU backend
+try:
+    import onnxruntime as ort
+    from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer
+except Exception:
+    # Fallback to the PyTorch SentenceTransformer backend
+    ort = None
+
+# Redis client library is optional; query caching is skipped without it
+try:
+    import redis
+except Exception:
+    redis = None
+
+MODEL_NAME = "intfloat/e5-large-v2"
+
+# Where the exported + quantized ONNX model is cached (built on first start)
+ONNX_MODEL_DIR = BASE_DIR / "models" / "e5-large-v2-onnx-int8"
+ONNX_MODEL_FILE = "model_quantized.onnx"
+
+# Tokenization limits and batch size for the ONNX backend
+MAX_SEQ_LENGTH = 512
+ONNX_BATCH_SIZE = 32
+
+# Batch sizes for the PyTorch backend; GPUs benefit from much larger batches
+TORCH_CPU_BATCH_SIZE = 32
+TORCH_GPU_BATCH_SIZE = 128
+
+
+# Query embedding cache (Redis). Entries expire after a day.
+# Lookups run on the request path, so socket timeouts are kept short: an
+# unreachable Redis costs a fraction of a second, not a TCP timeout.
+QUERY_CACHE_TTL = 86400
+REDIS_SOCKET_TIMEOUT = 0.2
+_redis = (
+    redis.Redis.from_url(
+        settings.REDIS_URL,
+        socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+        socket_timeout=REDIS_SOCKET_TIMEOUT,
+    )
+    if redis is not None and settings.REDIS_URL
+    else None
+)
+
+
 class EmbeddingService:
     """
     Wrapper around a sentence-transformer model used for semantic embeddings.
 
     The model is loaded once at startup and reused across requests to avoid
-    repeated initialization overhead.
+    repeated initialization overhead. When ONNX Runtime is available (and not
+    disabled via EMBEDDING_BACKEND=torch), an int8-quantized export of the
+    model is used instead of PyTorch FP32.
     """
 
     def __init__(self):
-        # Load pretrained embedding model
-        self.model = SentenceTransformer("intfloat/e5-large-v2")
+        self.model = None
+        self.session = None
+
+        if ort is not None and settings.EMBEDDING_BACKEND == "onnx":
+            self._load_onnx()
+            # int8 ONNX vectors are not interchangeable with PyTorch ones;
+            # indexes record this id so mismatched ones get re-embedded
+            self.embedding_id = f"{MODEL_NAME}:onnx-int8"
+        else:
+            self.embedding_id = f"{MODEL_NAME}:torch"
+            # Load pretrained embedding model, on the GPU in FP16 when present
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+            self.model = SentenceTransformer(MODEL_NAME, device=device)
+            if device == "cuda":
+                self.model.half()
+                self.batch_size = TORCH_GPU_BATCH_SIZE
+            else:
+                self.batch_size = TORCH_CPU_BATCH_SIZE
+
+    def _load_onnx(self):
+        """
+        Load the quantized ONNX model, exporting and quantizing it first if
+        no cached build exists yet.
+        """
+        model_path = ONNX_MODEL_DIR / ONNX_MODEL_FILE
+        if not model_path.exists():
+            self._export_onnx()
+
+        sess_options = ort.SessionOptions()
+        sess_options.intra_op_num_threads = os.cpu_count() or 1
+        self.session = ort.InferenceSession(
+            str(model_path),
+            sess_options,
+            providers=["CPUExecutionProvider"],
+        )
+        self.tokenizer = AutoTokenizer.from_pretrained(ONNX_MODEL_DIR)
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+    def _export_onnx(self):
+        """
+        Export and quantize the model into a temporary directory, then
+        rename it into place, so an interrupted export (or two workers
+        exporting at once) never leaves a partial model at ONNX_MODEL_DIR.
+        """
+        ONNX_MODEL_DIR.parent.mkdir(parents=True, exist_ok=True)
+        tmp_dir = Path(tempfile.mkdtemp(
+            prefix=f"{ONNX_MODEL_DIR.name}.",
+            dir=ONNX_MODEL_DIR.parent,
+        ))
+        try:
+            exported = ORTModelForFeatureExtraction.from_pretrained(MODEL_NAME, export=True)
+            quantizer = ORTQuantizer.from_pretrained(exported)
+            # Dynamic int8 quantization targeting VNNI int8 dot products
+            qconfig = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+            quantizer.quantize(save_dir=tmp_dir, quantization_config=qconfig)
+            AutoTokenizer.from_pretrained(MODEL_NAME).save_pretrained(tmp_dir)
+
+            # Leftover from an export interrupted by an older version
+            if ONNX_MODEL_DIR.exists() and not (ONNX_MODEL_DIR / ONNX_MODEL_FILE).exists():
+                shutil.rmtree(ONNX_MODEL_DIR, ignore_errors=True)
+            try:
+                os.replace(tmp_dir, ONNX_MODEL_DIR)
+            except OSError:
+                # Another worker finished its export first; use that one
+                if not (ONNX_MODEL_DIR / ONNX_MODEL_FILE).exists():
+                    raise
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def _encode_onnx(self, texts: list[str]) -> np.ndarray:
+        """
+        Embed a batch of texts with the ONNX model: mean pooling over the
+        attention mask followed by L2 normalization (same as the
+        SentenceTransformer pipeline for this model).
+        """
+        enc = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=MAX_SEQ_LENGTH,
+            return_tensors="np",
+        )
+        inputs = {k: v for k, v in enc.items() if k in self._input_names}
+        hidden = self.session.run(None, inputs)[0]
+
+        mask = enc["attention_mask"][..., None].astype(np.float32)
+        summed = (hidden * mask).sum(axis=1)
+        pooled = summed / np.clip(mask.sum(axis=1), 1e-9, None)
+
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return (pooled / np.clip(norms, 1e-12, None)).astype(np.float32, copy=False)
 
     def embed_texts(self, texts: list[str]) -> np.ndarray:
         """
@@ -29,12 +177,30 @@ class EmbeddingService:
         - Normalizes embeddings to unit length for cosine similarity
         - Returns float32 arrays suitable for FAISS indexing
         """
+        if self.session is not None:
+            # Batch texts of similar length together to minimize padding.
+            # Each batch is written straight into its original rows of a
+            # single preallocated output array (no concatenate/unsort copies).
+            order = np.argsort([-len(t) for t in texts], kind="stable")
+            result = None
+            for i in range(0, len(order), ONNX_BATCH_SIZE):
+                rows = order[i:i + ONNX_BATCH_SIZE]
+                batch = self._encode_onnx([texts[j] for j in rows])
+                if result is None:
+                    result = np.empty((len(texts), batch.shape[1]), dtype=np.float32)
+                result[rows] = batch
+            return result
+
+        # SentenceTransformer already length-sorts inputs internally
         embeddings = self.model.encode(
             texts,
+            batch_size=self.batch_size,
             show_progress_bar=False,
+            convert_to_numpy=True,
             normalize_embeddings=True
         )
-        return embeddings.astype("float32")
+        # encode() already returns float32; avoid copying the whole matrix
+        return embeddings.astype(np.float32, copy=False)
 
     def embed_query(self, query: str) -> np.ndarray:
         """
@@ -42,12 +208,47 @@ class EmbeddingService:
 
         - Output shape is (1, embedding_dim) to match FAISS search requirements
         - Normalized for cosine similarity comparison
+        - Served from the Redis cache when the same query was seen recently
+        """
+        key = None
+        if _redis is not None:
+            # Key includes the backend: ONNX int8 and PyTorch vectors differ
+            backend = "onnx" if self.session is not None else "torch"
+            digest = hashlib.sha1(query.encode()).hexdigest()
+            key = f"emb:{MODEL_NAME}:{backend}:{digest}"
+            try:
+                cached = _redis.get(key)
+            except redis.RedisError:
+                # Cache unavailable: fall back to computing the embedding
+                cached = None
+                key = None
+            if cached is not None:
+                return np.frombuffer(cached, dtype=np.float32).reshape(1, -1)
+
+        emb = self._encode_query(query)
+
+        if key is not None:
+            try:
+                _redis.setex(key, QUERY_CACHE_TTL, emb.tobytes())
+            except redis.RedisError:
+                pass
+        return emb
+
+    def _encode_query(self, query: str) -> np.ndarray:
+        """
+        Run the model on a single query (no caching).
         """
+        if self.session is not None:
+            return self._encode_onnx([query])
+
         emb = self.model.encode(
             query,
+            show_progress_bar=False,
+            convert_to_numpy=True,
             normalize_embeddings=True
         )
-        return emb.reshape(1, -1).astype("float32")
+        # encode() already returns float32; avoid an extra copy per query
+        return emb.reshape(1, -1).astype(np.float32, copy=False)
 
 
 # Singleton embedding service instance reused across the application
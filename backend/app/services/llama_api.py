@@ -1,8 +1,8 @@
 # app/services/llama_api.py
 
-import requests
-import json
-from typing import List, Dict, Generator
+import httpx
+import orjson
+from typing import List, Dict, AsyncGenerator
 from app.core.config import settings
 
 """
@@ -10,8 +10,8 @@ Streaming client for the language model API.
 
 Responsibilities:
 - Validate required configuration at startup
-- Send chat-style requests to the external model API
-- Stream partial responses token-by-token
+- Send chat-style requests to the external model API over pooled connections
+- Stream partial responses token-by-token without blocking the event loop
 - Gracefully handle API, timeout, and network errors
 """
 
@@ -32,12 +32,37 @@ HEADERS = {
     "Content-Type": "application/json",
 }
 
+# Shared async HTTP/2 client reused across requests.
+# Keeps TCP/TLS connections to the model API alive so each chat request
+# skips the connection handshake before the first token, and multiplexes
+# concurrent streams over those connections.
+http_client = httpx.AsyncClient(
+    http2=True,
+    headers=HEADERS,
+    timeout=httpx.Timeout(300.0, connect=10.0),
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+)
 
-def stream_llama_response(
+
+async def _iter_byte_lines(response: httpx.Response) -> AsyncGenerator[bytes, None]:
+    """
+    Split a streamed response body into lines without decoding it.
+    """
+    pending = b""
+    async for data in response.aiter_bytes():
+        pending += data
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line.rstrip(b"\r")
+    if pending:
+        yield pending
+
+
+async def stream_llama_response(
     messages: List[Dict],
     max_tokens: int = 500,
     temperature: float = 0.3,
-) -> Generator[str, None, None]:
+) -> AsyncGenerator[str, None]:
     """
     Stream a response from the language model API.
 
@@ -57,16 +82,11 @@ def stream_llama_response(
 
     try:
         # Open a streaming HTTP connection to the model API
-        with requests.post(
-            LLM_API_URL,
-            headers=HEADERS,
-            json=payload,
-            stream=True,
-            timeout=(10, 300),
-        ) as r:
+        async with http_client.stream("POST", LLM_API_URL, json=payload) as r:
 
             # Handle non-successful responses explicitly
             if r.status_code != 200:
+                await r.aread()
                 try:
                     err = r.json()
                 except Exception:
@@ -74,26 +94,21 @@ def stream_llama_response(
                 yield f"LLM error: {err}"
                 return
 
-            # Iterate over streamed response lines
-            for line in r.iter_lines():
-                if not line:
-                    continue
-
-                decoded = line.decode("utf-8").strip()
-
-                # Skip lines that do not follow streaming protocol
-                if not decoded.startswith("data:"):
+            # Iterate over streamed response lines (raw bytes, no decoding)
+            async for line in _iter_byte_lines(r):
+                # Skip empty keep-alives and lines that do not follow streaming protocol
+                if not line.startswith(b"data:"):
                     continue
 
-                chunk = decoded.replace("data:", "").strip()
+                chunk = line[5:].strip()
 
                 # End-of-stream marker
-                if chunk == "[DONE]":
+                if chunk == b"[DONE]":
                     break
 
                 try:
                     # Parse streamed JSON chunk and extract incremental content
-                    data = json.loads(chunk)
+                    data = orjson.loads(chunk)
                     delta = data["choices"][0]["delta"].get("content")
                     if delta:
                         yield delta
@@ -101,9 +116,9 @@ def stream_llama_response(
                     # Ignore malformed chunks and continue streaming
                     continue
 
-    except requests.exceptions.Timeout:
+    except httpx.TimeoutException:
         # Timeout while waiting for model response
         yield "LLM request timed out."
-    except requests.exceptions.RequestException:
+    except httpx.HTTPError:
         # Generic network or connection error
         yield "Network error while contacting LLM."
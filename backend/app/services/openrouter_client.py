@@ -1,6 +1,6 @@
-import requests
-import json
-from typing import List, Dict, Generator
+import httpx
+import orjson
+from typing import List, Dict, AsyncGenerator
 from app.core.config import settings
 
 """
@@ -18,12 +18,20 @@ HEADERS = {
     "Content-Type": "application/json",
 }
 
+# Shared async HTTP/2 client with pooled keep-alive connections
+http_client = httpx.AsyncClient(
+    http2=True,
+    headers=HEADERS,
+    timeout=httpx.Timeout(300.0, connect=10.0),
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+)
 
-def stream_openrouter_chat(
+
+async def stream_openrouter_chat(
     messages: List[Dict],
     max_tokens: int = 500,
     temperature: float = 0.6,
-) -> Generator[str, None, None]:
+) -> AsyncGenerator[str, None]:
     """
     Stream chat responses from a Groq/OpenRouter-compatible API.
 
@@ -43,12 +51,10 @@ def stream_openrouter_chat(
 
     try:
         # Open streaming POST request to the model API
-        with requests.post(
+        async with http_client.stream(
+            "POST",
             settings.LLAMA_API_URL,
-            headers=HEADERS,
             json=payload,
-            stream=True,
-            timeout=(10, 300),
         ) as r:
 
             # Handle non-successful HTTP responses early
@@ -56,25 +62,33 @@ def stream_openrouter_chat(
                 yield f"⚠️ LLM error ({r.status_code})"
                 return
 
-            buffer = ""
+            # Raw bytes received but not yet consumed as complete lines.
+            # scan_pos marks how far the buffer has already been searched
+            # for a newline, so each byte is scanned only once.
+            buffer = bytearray()
+            scan_pos = 0
 
             # Read raw streamed byte chunks
-            for chunk in r.iter_content(chunk_size=None):
+            async for chunk in r.aiter_bytes():
                 if not chunk:
                     continue
 
                 # Accumulate bytes until full JSON lines are available
-                buffer += chunk.decode("utf-8")
+                buffer += chunk
 
-                while "\n" in buffer:
-                    line, buffer = buffer.split("\n", 1)
-                    line = line.strip()
+                line_start = 0
+                while True:
+                    nl = buffer.find(b"\n", scan_pos)
+                    if nl == -1:
+                        break
+                    line = bytes(buffer[line_start:nl]).strip()
+                    line_start = scan_pos = nl + 1
                     if not line:
                         continue
 
                     try:
-                        # Parse each JSON line and extract incremental content
-                        data = json.loads(line)
+                        # Parse each JSON line (orjson accepts UTF-8 bytes directly)
+                        data = orjson.loads(line)
                         delta = data["choices"][0].get("delta", {}).get("content")
                         if delta:
                             yield delta
@@ -82,9 +96,13 @@ def stream_openrouter_chat(
                         # Ignore malformed or partial JSON fragments
                         continue
 
-    except requests.exceptions.Timeout:
+                # Drop consumed lines; the unscanned tail is all that remains
+                del buffer[:line_start]
+                scan_pos = len(buffer)
+
+    except httpx.TimeoutException:
         # Timeout while waiting for streamed response
         yield "LLM request timed out."
-    except requests.exceptions.RequestException:
+    except httpx.HTTPError:
         # Generic network or connection error
         yield "LLM network error."
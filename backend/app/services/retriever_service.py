@@ -1,8 +1,15 @@
+import os
 import faiss
+import orjson
+import msgspec
 import pickle
+import tempfile
+import threading
 import numpy as np
 from pathlib import Path
-from .embeddings import embedding_service
+from cachetools import LRUCache
+from .embeddings import embedding_service, MODEL_NAME
+from app.utils.file_utils import get_user_dirs
 
 """
 Document retrieval utilities based on FAISS.
@@ -11,30 +18,184 @@ This module is responsible for:
 - Persisting and loading text chunks extracted from documents
 - Building a FAISS index for semantic similarity search
 - Loading an existing FAISS index from disk
+- Keeping recently used per-user indexes in memory
 
 The index uses cosine similarity via normalized inner product.
 """
 
+# File names used inside each user's index directory.
+# Chunks are stored as JSON Lines (one JSON string per line) so uploads can
+# append new chunks instead of rewriting the whole store.
+INDEX_FILENAME = "faiss.index"
+CHUNKS_FILENAME = "chunks.jsonl"
+
+# Pickled chunk store written by earlier versions; migrated on first use
+LEGACY_CHUNKS_FILENAME = "chunk_texts.pkl"
+
+# Records which embedding model/backend produced the vectors in the index.
+# Indexes from before this file existed were built with PyTorch.
+EMBEDDING_ID_FILENAME = "embedding.id"
+LEGACY_EMBEDDING_ID = f"{MODEL_NAME}:torch"
+
+
+def document_chunks_path(index_dir: Path, document_id: int) -> Path:
+    """
+    Path of the per-document chunk file inside a user's index directory.
+
+    Each uploaded document keeps its own chunks so the merged chunk store
+    can be rebuilt without re-extracting every file.
+    """
+    return index_dir / f"{document_id}.chunks.msgpack"
+
+
+# Index layout thresholds.
+# - Below HNSW_MIN_VECTORS an exact flat scan is cheap and needs no graph build.
+# - Up to IVF_MIN_VECTORS an HNSW graph over full vectors is used: sub-linear
+#   search with near-exact recall.
+# - Larger corpora switch to a compressed IVF + PQ index trained on a
+#   sample of the corpus itself. OPQ/PQ scores are only approximations
+#   (vectors are also reduced to 256 dims), so candidates are re-scored
+#   against the full vectors (RFlat) and returned scores stay exact cosines
+#   that the chat similarity thresholds can rely on.
+HNSW_MIN_VECTORS = 10_000
+IVF_MIN_VECTORS = 100_000
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+IVF_PQ_FACTORY = "OPQ64_256,IVF{nlist}_HNSW32,PQ64,RFlat"
+IVF_TRAIN_SAMPLE = 131_072
+
+# Let FAISS use every core for index builds and searches
+faiss.omp_set_num_threads(os.cpu_count() or 1)
+
+# Search-time accuracy/speed knobs applied whenever an index is loaded
+HNSW_EF_SEARCH = 128
+IVF_NPROBE = 32
+IVF_REFINE_K_FACTOR = 4
+
+# In-memory cache of loaded indexes: user_id -> (index, chunks, mtime_ns).
+# Bounded so memory stays finite with many active users.
+_index_cache = LRUCache(maxsize=64)
+_index_cache_lock = threading.Lock()
+
+
 def load_chunks(path: Path):
     """
     Load previously saved document text chunks from disk.
 
     Returns an empty list if the chunk file does not exist.
+    A trailing line without a newline (an append still in progress or
+    interrupted) is ignored.
     """
     if not path.exists():
         return []
+    chunks = []
     with path.open("rb") as f:
-        return pickle.load(f)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            chunks.append(orjson.loads(line))
+    return chunks
 
 
 def save_chunks(path: Path, chunks: list):
     """
-    Persist text chunks to disk using pickle.
+    Persist text chunks to disk as JSON Lines, replacing any existing file.
 
+    The file is written under a temporary name and swapped into place, so
+    readers never see a partially written store.
     These chunks are later embedded and indexed for retrieval.
     """
-    with path.open("wb") as f:
-        pickle.dump(chunks, f)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with tmp_path.open("wb") as f:
+        f.writelines(orjson.dumps(c) + b"\n" for c in chunks)
+    os.replace(tmp_path, path)
+
+
+def append_chunks(path: Path, chunks: list):
+    """
+    Append text chunks to an existing JSON Lines chunk store.
+
+    Only the new chunks are written, so the cost does not grow with the
+    size of the existing store. An unterminated tail left by an interrupted
+    append is cut off first, so it cannot merge with the next chunk's line.
+    Callers must hold the user's index lock.
+    """
+    with path.open("a+b") as f:
+        end = f.seek(0, os.SEEK_END)
+        keep = end
+        while keep > 0:
+            start = max(0, keep - 65536)
+            f.seek(start)
+            block = f.read(keep - start)
+            newline = block.rfind(b"\n")
+            if newline != -1:
+                keep = start + newline + 1
+                break
+            keep = start
+        if keep != end:
+            f.truncate(keep)
+        f.writelines(orjson.dumps(c) + b"\n" for c in chunks)
+
+
+# Per-document chunk files are written once and always read whole, so they
+# use a single msgpack array (length-prefixed UTF-8 strings) instead of JSONL.
+_doc_chunks_encoder = msgspec.msgpack.Encoder()
+_doc_chunks_decoder = msgspec.msgpack.Decoder(list[str])
+
+
+def load_document_chunks(path: Path) -> list[str]:
+    """
+    Load one document's chunks from its per-document chunk file.
+
+    Returns an empty list if the file does not exist.
+    """
+    if not path.exists():
+        return []
+    return _doc_chunks_decoder.decode(path.read_bytes())
+
+
+def save_document_chunks(path: Path, chunks: list[str]):
+    """
+    Persist one document's chunks, replacing any existing file.
+
+    Written under a temporary name and swapped into place, so a rebuild
+    never reads a partially written file.
+    """
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_bytes(_doc_chunks_encoder.encode(chunks))
+    os.replace(tmp_path, path)
+
+
+def migrate_legacy_chunks(index_dir: Path):
+    """
+    Convert a pickled chunk store from earlier versions to JSON Lines.
+
+    No-op if there is no legacy file or the new store already exists.
+    Safe to call without the user's index lock: the converted store is
+    written under a unique temporary name and linked into place only if no
+    store exists yet, so a concurrent migration or append is never
+    overwritten.
+    """
+    legacy_path = index_dir / LEGACY_CHUNKS_FILENAME
+    chunk_path = index_dir / CHUNKS_FILENAME
+    if not legacy_path.exists() or chunk_path.exists():
+        return
+    try:
+        with legacy_path.open("rb") as f:
+            chunks = pickle.load(f)
+    except FileNotFoundError:
+        # Another caller finished the migration first
+        return
+    fd, tmp_name = tempfile.mkstemp(dir=index_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.writelines(orjson.dumps(c) + b"\n" for c in chunks)
+        os.link(tmp_name, chunk_path)
+    except FileExistsError:
+        pass
+    finally:
+        os.unlink(tmp_name)
+    legacy_path.unlink(missing_ok=True)
 
 
 def build_faiss_index(chunks: list[str], index_path: Path):
@@ -42,40 +203,177 @@ def build_faiss_index(chunks: list[str], index_path: Path):
     Build and persist a FAISS index from a list of text chunks.
 
     Steps:
-    1. Generate vector embeddings for all chunks
-    2. Normalize embeddings for cosine similarity
-    3. Build an inner-product FAISS index
-    4. Persist the index to disk
+    1. Generate normalized vector embeddings for all chunks
+    2. Build an inner-product FAISS index sized to the corpus
+       (flat, HNSW, or IVF-PQ for large corpora)
+    3. Persist the index to disk
     """
 
     if not chunks:
         return None
 
-    # 1️Generate embeddings for document chunks
+    # 1️Generate embeddings for document chunks.
+    # embed_texts() already L2-normalizes them, so inner product behaves as
+    # cosine similarity without a second normalization pass.
     embeddings = embedding_service.embed_texts(chunks)
 
-    #  Normalize embeddings (CRITICAL for cosine similarity)
-    # Using L2 normalization allows inner product to behave as cosine similarity
-    faiss.normalize_L2(embeddings)
-
     # Dimensionality of embeddings
     dim = embeddings.shape[1]
+    n = embeddings.shape[0]
 
     # Create FAISS index using inner product similarity
-    index = faiss.IndexFlatIP(dim)
+    if n < HNSW_MIN_VECTORS:
+        index = faiss.IndexFlatIP(dim)
+    elif n < IVF_MIN_VECTORS:
+        index = faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    else:
+        nlist = int(np.sqrt(n))
+        index = faiss.index_factory(
+            dim,
+            IVF_PQ_FACTORY.format(nlist=nlist),
+            faiss.METRIC_INNER_PRODUCT,
+        )
+        # IVF/PQ codebooks are learned from a random sample of the corpus
+        rng = np.random.default_rng(0)
+        sample = rng.choice(n, size=min(n, IVF_TRAIN_SAMPLE), replace=False)
+        index.train(embeddings[np.sort(sample)])
     index.add(embeddings)
 
-    # Persist index to disk for reuse across requests
-    faiss.write_index(index, str(index_path))
+    # Persist index to disk for reuse across requests, tagged with the
+    # embedding model/backend that produced its vectors
+    _write_index_atomic(index, index_path)
+    _write_embedding_id(index_path.parent)
+    _configure_search(index)
     return index
 
 
+def _write_embedding_id(index_dir: Path):
+    """
+    Record the current embedding id next to a freshly built index.
+    """
+    id_path = index_dir / EMBEDDING_ID_FILENAME
+    tmp_path = id_path.with_name(id_path.name + ".tmp")
+    tmp_path.write_text(embedding_service.embedding_id)
+    os.replace(tmp_path, id_path)
+
+
+def index_embedding_matches(index_dir: Path) -> bool:
+    """
+    Whether the index in `index_dir` was embedded with the current
+    model/backend. Query vectors from a different backend (e.g. int8 ONNX
+    vs PyTorch FP32) are not comparable with the stored vectors.
+    """
+    id_path = index_dir / EMBEDDING_ID_FILENAME
+    try:
+        stored = id_path.read_text().strip()
+    except FileNotFoundError:
+        stored = LEGACY_EMBEDDING_ID
+    return stored == embedding_service.embedding_id
+
+
+def user_index_is_stale(user_id: int) -> bool:
+    """
+    Whether the user has an index that must be re-embedded before use.
+    """
+    index_dir = get_user_dirs(user_id)["index"]
+    return (index_dir / INDEX_FILENAME).exists() and not index_embedding_matches(index_dir)
+
+
+def _write_index_atomic(index, index_path: Path):
+    """
+    Write an index next to its final path, then swap it into place.
+
+    IVF indexes are loaded memory-mapped, so the file must never be
+    rewritten in place; renaming leaves any mapped (old) file intact, and
+    readers never see a partially written index.
+    """
+    tmp_path = index_path.with_name(index_path.name + ".tmp")
+    faiss.write_index(index, str(tmp_path))
+    os.replace(tmp_path, index_path)
+
+
+def _configure_search(index):
+    """
+    Apply search-time parameters (not persisted by FAISS) to a loaded index.
+    """
+    # Keep `index` bound: downcast wrappers do not own the C++ object
+    base = faiss.downcast_index(index)
+    if isinstance(base, faiss.IndexRefine):
+        # Re-score k * k_factor PQ candidates exactly, then search the base
+        base.k_factor = IVF_REFINE_K_FACTOR
+        base = faiss.downcast_index(base.base_index)
+
+    ivf = faiss.try_extract_index_ivf(base)
+    if ivf is not None:
+        ivf.nprobe = IVF_NPROBE
+        return
+
+    if isinstance(base, faiss.IndexHNSW):
+        base.hnsw.efSearch = HNSW_EF_SEARCH
+
+
 def load_faiss_index(index_path: Path):
     """
     Load a previously built FAISS index from disk.
 
+    The file is opened with IO_FLAG_MMAP | IO_FLAG_READ_ONLY. With the
+    pinned FAISS version this only memory-maps the inverted lists of the
+    IVF-PQ tier; its exact refine vectors, and flat and HNSW indexes, are
+    still read fully into memory.
     Returns None if the index file does not exist.
     """
     if not index_path.exists():
         return None
-    return faiss.read_index(str(index_path))
+    index = faiss.read_index(
+        str(index_path),
+        faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY,
+    )
+    _configure_search(index)
+    return index
+
+
+def get_user_index(user_id: int):
+    """
+    Return `(faiss_index, chunks)` for a user, served from memory when possible.
+
+    The on-disk files are only re-read when their modification time changes,
+    so repeated queries do not deserialize the index again.
+    Returns `(None, [])` if the user has no index yet, or if it was built
+    with a different embedding model/backend (see user_index_is_stale).
+    """
+    index_dir = get_user_dirs(user_id)["index"]
+    index_path = index_dir / INDEX_FILENAME
+    chunk_path = index_dir / CHUNKS_FILENAME
+    migrate_legacy_chunks(index_dir)
+
+    try:
+        mtime = max(index_path.stat().st_mtime_ns, chunk_path.stat().st_mtime_ns)
+    except FileNotFoundError:
+        invalidate_user_index(user_id)
+        return None, []
+
+    with _index_cache_lock:
+        cached = _index_cache.get(user_id)
+    if cached is not None and cached[2] == mtime:
+        return cached[0], cached[1]
+
+    # Checked on (re)load only: a cached entry was validated when loaded
+    if not index_embedding_matches(index_dir):
+        invalidate_user_index(user_id)
+        return None, []
+
+    index = load_faiss_index(index_path)
+    chunks = load_chunks(chunk_path)
+
+    with _index_cache_lock:
+        _index_cache[user_id] = (index, chunks, mtime)
+    return index, chunks
+
+
+def invalidate_user_index(user_id: int):
+    """
+    Drop a user's cached index so the next lookup reloads it from disk.
+    """
+    with _index_cache_lock:
+        _index_cache.pop(user_id, None)
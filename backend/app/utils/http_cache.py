@@ -0,0 +1,54 @@
+import hashlib
+from fastapi import HTTPException, Request
+
+"""
+HTTP conditional request helpers.
+
+This module:
+- Derives compact ETags from cheap database fingerprints
+- Short-circuits unchanged GET responses with 304 Not Modified
+"""
+
+# Clients must revalidate on every use, and shared caches must not store
+# per-user responses.
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts) -> str:
+    """
+    Build a weak ETag from the given fingerprint values.
+    """
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Weak comparison of an If-None-Match header value against an ETag.
+    """
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == opaque
+        for candidate in if_none_match.split(",")
+    )
+
+
+def check_not_modified(request: Request, *parts) -> dict:
+    """
+    Build caching headers for a GET response fingerprinted by `parts`.
+
+    Raises a 304 Not Modified response if the client's cached copy
+    (sent via If-None-Match) is still current, so the endpoint body and
+    serialization are skipped entirely. Otherwise returns the headers
+    for the endpoint to attach to its response.
+    """
+    etag = make_etag(*parts)
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        raise HTTPException(status_code=304, headers=headers)
+
+    return headers
@@ -0,0 +1,36 @@
+from decimal import Decimal
+from typing import Any
+import orjson
+from fastapi.responses import ORJSONResponse as _BaseORJSONResponse
+
+"""
+JSON response class used across the API.
+
+orjson natively encodes datetimes, UUIDs and dataclasses; this adds the
+remaining types that can come back from ORM queries.
+"""
+
+
+def _orjson_default(obj: Any):
+    """
+    Fallback encoder for types orjson does not support natively.
+    """
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+class ORJSONResponse(_BaseORJSONResponse):
+    """
+    orjson-backed JSON response with support for Decimal values.
+
+    Endpoints may return this directly with plain dicts/lists to skip
+    FastAPI's jsonable_encoder pass.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(
+            content,
+            default=_orjson_default,
+            option=orjson.OPT_NON_STR_KEYS,
+        )
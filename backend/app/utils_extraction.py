@@ -2,6 +2,11 @@
 
 import os
 import re
+import threading
+import multiprocessing
+import xxhash
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from pathlib import Path
 from typing import List
 
@@ -14,26 +19,122 @@ This module is responsible for:
 - Splitting text into overlapping chunks suitable for embeddings and retrieval
 """
 
-# Attempt to load sentence-level splitter for higher-quality chunking
-try:
-    from sentence_splitter import SentenceSplitter
-    splitter = SentenceSplitter(language='en')
-except Exception:
-    # Fallback when sentence_splitter is unavailable
-    splitter = None
-
 # External libraries for document parsing
 from docx import Document as DocxDocument  # .docx support
 import fitz  # PyMuPDF for .pdf support
 
+# Precompiled patterns and translation table used by clean_text
+_NBSP = {0xA0: 0x20}                               # Non-breaking space -> space
+_WS = re.compile(r"[ \t]+")                        # Runs of spaces/tabs
+_NL = re.compile(r"[\r\n]{2,}")                    # Runs of newlines
+# Bytes outside tab/newline/CR and printable ASCII; every byte of a
+# multi-byte UTF-8 character is >= 0x80, so whole characters are removed
+_DELETE_BYTES = bytes(
+    b for b in range(256) if not (b in (0x09, 0x0A, 0x0D) or 0x20 <= b <= 0x7E)
+)
+
+# PDF extraction settings.
+# Words hyphenated across line breaks are rejoined by PyMuPDF itself.
+PDF_TEXT_FLAGS = fitz.TEXTFLAGS_TEXT | fitz.TEXT_DEHYPHENATE
+# PyMuPDF is not thread-safe, so large PDFs are split into page ranges
+# handled by separate processes (each opens its own document).
+PDF_PARALLEL_MIN_PAGES = 64
+PDF_PAGES_PER_WORKER = 32
+# One pool shared by all extractions, so concurrent uploads queue for a
+# bounded number of workers instead of each starting its own pool
+PDF_MAX_WORKERS = max(1, (os.cpu_count() or 1) // 2)
+
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
+
+
+def _get_pdf_pool() -> ProcessPoolExecutor:
+    """
+    Return the shared PDF worker pool, creating it on first use.
+
+    Workers are spawned, not forked: the API process is multi-threaded
+    (event loop, ONNX Runtime/torch/OpenMP pools) and forking it can
+    deadlock the child.
+    """
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            _pdf_pool = ProcessPoolExecutor(
+                max_workers=PDF_MAX_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pdf_pool
+
+
+def _reset_pdf_pool(pool: ProcessPoolExecutor):
+    """
+    Discard a broken shared pool so the next extraction starts a new one.
+    """
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is pool:
+            _pdf_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _extract_pdf_pages(filepath: str, start: int, stop: int) -> List[str]:
+    """
+    Extract the text of pages [start, stop) of a PDF.
+
+    Top-level so it can be run in a worker process. A page that fails to
+    parse is skipped; the rest of the document is still returned.
+    """
+    texts = []
+    with fitz.open(filepath) as doc:
+        for i in range(start, stop):
+            try:
+                page_text = doc.load_page(i).get_text(flags=PDF_TEXT_FLAGS)
+            except Exception as e:
+                print(f"[WARN] Skipping page {i + 1} of {filepath}: {e}")
+                continue
+            if page_text:
+                texts.append(page_text)
+    return texts
+
+
+def _extract_pdf_text(filepath: str, parallel: bool) -> str:
+    """
+    Extract text from every page of a PDF, in page order.
+
+    PDFs with many pages are processed in parallel page ranges when
+    `parallel` is set; small ones are read in-process.
+    """
+    with fitz.open(filepath) as doc:
+        page_count = doc.page_count
+
+    workers = min(PDF_MAX_WORKERS, page_count // PDF_PAGES_PER_WORKER)
+    if not parallel or page_count < PDF_PARALLEL_MIN_PAGES or workers <= 1:
+        return "\n".join(_extract_pdf_pages(filepath, 0, page_count))
+
+    # Contiguous page ranges, one per worker
+    step = -(-page_count // workers)
+    starts = range(0, page_count, step)
+    stops = [min(start + step, page_count) for start in starts]
+
+    pool = _get_pdf_pool()
+    try:
+        parts = list(pool.map(_extract_pdf_pages, repeat(filepath), starts, stops))
+    except Exception as e:
+        # Worker crashed or pool unusable: fall back to in-process extraction
+        print(f"[WARN] Parallel PDF extraction failed for {filepath}: {e}")
+        _reset_pdf_pool(pool)
+        return "\n".join(_extract_pdf_pages(filepath, 0, page_count))
+    return "\n".join(text for part in parts for text in part)
+
 
-def extract_text_from_file(filepath: str) -> str:
+def extract_text_from_file(filepath: str, parallel: bool = True) -> str:
     """
     Extract raw text from a file based on its extension.
 
     Supported formats:
     - .txt   : plain text files
-    - .pdf   : parsed using PyMuPDF
+    - .pdf   : parsed using PyMuPDF (large files in parallel page ranges,
+               unless `parallel` is False)
     - .docx  : parsed using python-docx
 
     Returns extracted text or an empty string on failure.
@@ -49,17 +150,7 @@ def extract_text_from_file(filepath: str) -> str:
 
         elif ext == ".pdf":
             # Extract text from each PDF page
-            text = []
-            with fitz.open(filepath) as doc:
-                for page in doc:
-                    try:
-                        page_text = page.get_text()
-                    except Exception:
-                        # Fallback for older PyMuPDF versions
-                        page_text = page.get_text("text") if hasattr(page, "get_text") else ""
-                    if page_text:
-                        text.append(page_text)
-            return "\n".join(text)
+            return _extract_pdf_text(filepath, parallel)
 
         elif ext == ".docx":
             # Extract text from Word document paragraphs
@@ -89,11 +180,15 @@ def clean_text(text: str) -> str:
     if not text:
         return ""
 
-    text = text.replace('\u00A0', ' ')                      # Replace non-breaking spaces
-    text = re.sub(r"[ \t]+", " ", text)                    # Collapse multiple spaces/tabs
-    text = re.sub(r"[\r\n]{2,}", "\n", text)               # Collapse multiple newlines
-    # Remove most non-printable Unicode characters
-    text = re.sub(r"[^\x09\x0A\x0D\x20-\x7E]+", "", text)
+    text = text.translate(_NBSP)                # Replace non-breaking spaces
+    text = _WS.sub(" ", text)                   # Collapse multiple spaces/tabs
+    text = _NL.sub("\n", text)                  # Collapse multiple newlines
+    # Remove most non-printable Unicode characters (byte-table filter)
+    text = (
+        text.encode("utf-8", "ignore")
+        .translate(None, _DELETE_BYTES)
+        .decode("ascii")
+    )
 
     return text.strip()
 
@@ -103,9 +198,8 @@ def chunk_text(text: str, chunk_size: int = 300, overlap: int = 50) -> List[str]
     Split cleaned text into overlapping chunks.
 
     Strategy:
-    - Prefer sentence-level splitting when available
-    - Fallback to newline / punctuation-based splitting
-    - Combine tokens into fixed-size overlapping chunks
+    - Tokenize the whole text once on whitespace
+    - Slice fixed-size overlapping windows by index
 
     Parameters:
     - chunk_size: target number of tokens per chunk
@@ -117,63 +211,52 @@ def chunk_text(text: str, chunk_size: int = 300, overlap: int = 50) -> List[str]
     if not text or not text.strip():
         return []
 
-    # Attempt sentence-level splitting for better semantic coherence
-    if splitter:
-        try:
-            sentences = splitter.split(text)
-        except Exception:
-            sentences = None
-    else:
-        sentences = None
-
-    if not sentences or len(sentences) <= 1:
-        # Fallback: split on newlines and sentence boundaries
-        parts = []
-        for line in text.split("\n"):
-            line = line.strip()
-            if not line:
-                continue
-            if len(line) > 500:
-                # Further split very long lines on sentence boundaries
-                parts.extend(re.split(r'(?<=\.)\s+', line))
-            else:
-                parts.append(line)
-        sentences = [p for p in parts if p.strip()]
-
-    # Final cleanup of sentence list
-    sentences = [s.strip() for s in sentences if s and s.strip()]
+    all_tokens = text.split()
+    n_tokens = len(all_tokens)
+    step = chunk_size - overlap
 
     chunks = []
-    current_tokens = []
-
-    # Build overlapping chunks by token count
-    for sentence in sentences:
-        tokens = sentence.split()
-        if not tokens:
-            continue
-        current_tokens.extend(tokens)
-
-        while len(current_tokens) >= chunk_size:
-            chunk_tokens = current_tokens[:chunk_size]
-            chunks.append(" ".join(chunk_tokens).strip())
-            # Retain overlap tokens for next chunk
-            current_tokens = current_tokens[chunk_size - overlap:]
 
-    # Flush remaining tokens
-    if current_tokens:
-        chunks.append(" ".join(current_tokens).strip())
+    # Build overlapping chunks by token count; the last window holds
+    # whatever tokens remain after the final full-size chunk
+    for start in range(0, n_tokens, step):
+        chunks.append(" ".join(all_tokens[start:start + chunk_size]))
+        if start + chunk_size > n_tokens:
+            break
 
-    # Deduplicate near-identical chunks while preserving order
+    # Deduplicate identical chunks while preserving order.
+    # Only 64-bit hashes are kept, not the chunk strings themselves.
     seen = set()
     unique_chunks = []
     for c in chunks:
-        if c and c not in seen:
+        if not c:
+            continue
+        h = xxhash.xxh3_64_intdigest(c)
+        if h not in seen:
             unique_chunks.append(c)
-            seen.add(c)
+            seen.add(h)
 
     return unique_chunks
 
 
+def _process_one(
+    fpath: str,
+    chunk_size: int,
+    chunk_overlap: int
+) -> List[str]:
+    """
+    Extract, clean, and chunk a single file.
+
+    Top-level so it can be pickled and run in a worker process.
+    Returns an empty list when no clean text could be extracted.
+    """
+    # Already running in a worker process: do not fan out PDFs further
+    clean = clean_text(extract_text_from_file(fpath, parallel=False))
+    if not clean.strip():
+        return []
+    return chunk_text(clean, chunk_size, chunk_overlap)
+
+
 def extract_and_chunk_documents(
     documents_path: str,
     chunk_size: int,
@@ -183,29 +266,40 @@ def extract_and_chunk_documents(
     Extract, clean, and chunk all supported documents in a directory.
 
     - Walks the directory recursively
-    - Processes .txt, .pdf, and .docx files
+    - Processes .txt, .pdf, and .docx files in parallel worker processes
     - Logs progress and summary statistics
 
     Returns a list of all generated chunks.
     """
 
-    all_chunks = []
-    total_documents = 0
-
+    # Collect supported files first so parsing can be spread across cores
+    filepaths = []
     for root, _, files in os.walk(documents_path):
         for fname in files:
             if fname.lower().endswith((".txt", ".pdf", ".docx")):
-                fpath = os.path.join(root, fname)
-                raw_text = extract_text_from_file(fpath)
-                clean = clean_text(raw_text)
-
-                if clean.strip():
-                    total_documents += 1
-                    chunks = chunk_text(clean, chunk_size, chunk_overlap)
-                    all_chunks.extend(chunks)
-                    print(f"[OK] {fname} → {len(chunks)} chunks")
-                else:
-                    print(f"[SKIP] {fname} → No clean text extracted")
+                filepaths.append(os.path.join(root, fname))
+
+    all_chunks = []
+    total_documents = 0
+
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        results = executor.map(
+            _process_one,
+            filepaths,
+            repeat(chunk_size),
+            repeat(chunk_overlap),
+            chunksize=4,
+        )
+
+        # Results arrive in file order, so output matches the serial walk
+        for fpath, chunks in zip(filepaths, results):
+            fname = os.path.basename(fpath)
+            if chunks:
+                total_documents += 1
+                all_chunks.extend(chunks)
+                print(f"[OK] {fname} → {len(chunks)} chunks")
+            else:
+                print(f"[SKIP] {fname} → No clean text extracted")
 
     print(f"\nTotal documents processed: {total_documents}")
     print(f"Total chunks generated: {len(all_chunks)}")
@@ -8,7 +8,8 @@ Database initialization script.
 This script:
 - Imports all ORM models to ensure they are registered with SQLAlchemy
 - Creates database tables based on model metadata
-- Is typically run once during initial setup or development
+- Adds indexes missing from tables created by earlier versions
+- Is safe to re-run after upgrades
 """
 
 
@@ -23,6 +24,14 @@ def main():
     Base.metadata.create_all(bind=engine)
     print("Database tables created successfully.")
 
+    # create_all() skips tables that already exist, so indexes added to
+    # the models later are created here individually.
+    print("Creating missing indexes...")
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    print("Indexes are up to date.")
+
 
 # Entry point when running the script directly
 if __name__ == "__main__":